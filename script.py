@@ -1,19 +1,173 @@
 import os
 import json
-import openai
 import argparse
-import time
+import asyncio
+import atexit
+import fcntl
+import hashlib
+import random
+import sqlite3
+
+import httpx
+import ijson
+import orjson
+import tiktoken
 
 # Read OpenAI API key from the environment variable
 openai_api_key = os.getenv("OPENAI_API_KEY")
 if not openai_api_key:
     raise ValueError("The OPENAI_API_KEY environment variable is not set!")
-openai.api_key = openai_api_key
+
+# OpenAI API endpoint; can be overridden with --openai-endpoint
+api_base = "https://api.openai.com/v1"
+
+# Single shared HTTP client: HTTP/2 with a keep-alive connection pool so that
+# concurrent batch requests multiplex over a few warm connections instead of
+# paying a TLS handshake per call. Connections stay warm for 60s so gaps
+# between languages don't force a reconnect.
+client = httpx.AsyncClient(
+    http2=True,
+    timeout=60,
+    limits=httpx.Limits(
+        max_connections=32,
+        max_keepalive_connections=16,
+        keepalive_expiry=60,
+    ),
+)
+
+# Maximum number of batch requests in flight at once (RPM safety).
+MAX_CONCURRENT_REQUESTS = 8
+
+# Prompt pieces are frozen at module level; only the language pair is
+# substituted per batch. Localized instruction variants live here rather than
+# in duplicated copies of the script; pick one with the XCT_LOCALE env var.
+PROMPTS = {
+    "en": {
+        "system": "You are a professional translation assistant.",
+        "template": (
+            "Please translate the following texts from {src} to {tgt}.\n"
+            "Return the translation results as a JSON object of the form:\n"
+            '{{"translations": ["Translation1", "Translation2", ...]}}\n'
+            "The array must contain exactly one translation per input text, in order.\n"
+        ),
+    },
+    "zh": {
+        "system": "你是一名专业的翻译助手。",
+        "template": (
+            "请将以下文本从 {src} 翻译成 {tgt}。\n"
+            "请以如下形式的 JSON 对象返回翻译结果：\n"
+            '{{"translations": ["翻译1", "翻译2", ...]}}\n'
+            "数组必须按顺序包含每条输入文本对应的一条翻译结果。\n"
+        ),
+    },
+}
+_prompts = PROMPTS.get(os.getenv("XCT_LOCALE", "en"), PROMPTS["en"])
+SYSTEM_MESSAGE = _prompts["system"]
+PROMPT_TEMPLATE = _prompts["template"]
+
+# Model routing: short UI labels ("OK", "Save changes") don't need the
+# stronger model's reasoning, so they go to the cheap tier; longer prose
+# goes to the stronger model.
+SHORT_TEXT_MODEL = "gpt-4o-mini"
+LONG_TEXT_MODEL = "gpt-4o"
+SHORT_TEXT_MAX_WORDS = 3
+
+def is_short_text(text):
+    """
+    True for texts short enough to route to the cheap model tier.
+    """
+    return len(text.split()) <= SHORT_TEXT_MAX_WORDS
+
+# Retry budget: transient network/server errors get a few attempts, while
+# 429 rate limits are worth waiting out longer.
+MAX_RETRIES = 3
+MAX_RATE_LIMIT_RETRIES = 6
+
+def backoff_delay(attempt):
+    """
+    Exponential backoff with jitter, capped at 30 seconds.
+    """
+    return min(30, 1.5 * (2 ** attempt)) + random.random()
+
+# Batch packing: fit as many texts as possible under the input token budget
+# rather than a fixed count, so short UI strings share a round-trip.
+BATCH_TOKEN_BUDGET = 3000
+BATCH_MAX_TEXTS = 50
+BATCH_PER_TEXT_OVERHEAD = 4  # enumerator prefix ("12. ") and newline
+
+_encoding = None
+
+def get_encoding():
+    """
+    Return the (lazily created) tiktoken encoding for the translation model.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.encoding_for_model("gpt-4o-mini")
+        except KeyError:
+            _encoding = tiktoken.get_encoding("o200k_base")
+    return _encoding
+
+def pack_batches(texts):
+    """
+    Greedily pack the texts into batches whose estimated input token count
+    stays below BATCH_TOKEN_BUDGET, with at most BATCH_MAX_TEXTS per batch.
+    Returns a list of text lists preserving the input order.
+    """
+    enc = get_encoding()
+    batches = []
+    current = []
+    current_tokens = 0
+    for text in texts:
+        cost = len(enc.encode(text)) + BATCH_PER_TEXT_OVERHEAD
+        if current and (current_tokens + cost > BATCH_TOKEN_BUDGET or len(current) >= BATCH_MAX_TEXTS):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(text)
+        current_tokens += cost
+    if current:
+        batches.append(current)
+    return batches
+
+# Persistent translation memory: previously translated strings are cached
+# across runs so identical source texts never hit the API twice.
+TM_CACHE_PATH = os.path.expanduser("~/.cache/xc-translator/tm.sqlite")
+
+def tm_connect():
+    """
+    Open (creating if necessary) the translation memory database and return the connection.
+    """
+    os.makedirs(os.path.dirname(TM_CACHE_PATH), exist_ok=True)
+    conn = sqlite3.connect(TM_CACHE_PATH, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS tm(h BLOB PRIMARY KEY, v TEXT)")
+    return conn
+
+def tm_hash(source_lang, target_lang, text):
+    """
+    Compute the cache key for a (source language, target language, text) triple.
+    """
+    return hashlib.blake2b(f"{source_lang}|{target_lang}|{text}".encode(), digest_size=16).digest()
+
+def tm_get(conn, key_hash):
+    """
+    Look up a cached translation; returns None on a cache miss.
+    """
+    row = conn.execute("SELECT v FROM tm WHERE h = ?", (key_hash,)).fetchone()
+    return row[0] if row else None
+
+def tm_put_many(conn, pairs):
+    """
+    Store a batch of (key_hash, translation) pairs in the translation memory.
+    """
+    conn.executemany("INSERT OR REPLACE INTO tm(h, v) VALUES(?, ?)", pairs)
 
 def parse_xcstrings(file_path):
     """
     Parse the Localizable.xcstrings file (in XC Strings format) and return the entire JSON data.
-    
+
     Expected file format example:
     {
       "version": "1.0",
@@ -38,15 +192,88 @@ def parse_xcstrings(file_path):
       }
     }
     """
+    data = {}
+    strings = {}
+    has_strings = False
     try:
-        with open(file_path, 'r', encoding='utf-8-sig') as f:
-            data = json.load(f)
-    except json.JSONDecodeError as e:
+        # Event scan for the top-level members other than "strings", whose
+        # subtree is skipped here; values of any shape are preserved so
+        # unknown fields survive the rewrite.
+        with _open_json_stream(file_path) as f:
+            events = ijson.basic_parse(f, use_float=True)
+            depth = 0
+            for event, value in events:
+                if depth == 0:
+                    if event != 'start_map':
+                        raise ValueError("JSON format error: top-level value is not an object")
+                    depth = 1
+                    continue
+                if event == 'end_map':
+                    break
+                # depth == 1: every event here is a map_key naming a member
+                if value == 'strings':
+                    has_strings = True
+                    _skip_value(events)
+                else:
+                    data[value] = _build_value(events)
+        # Stream the string entries one at a time, so the raw file bytes are
+        # never held in memory alongside a second full parse tree.
+        with _open_json_stream(file_path) as f:
+            for key, entry in ijson.kvitems(f, 'strings', use_float=True):
+                strings[key] = entry
+    except ijson.JSONError as e:
         raise ValueError(f"JSON parsing error. Please check the file format: {e}")
-    if not isinstance(data, dict) or "strings" not in data:
+    if not has_strings:
         raise ValueError("JSON format error: missing 'strings' field")
+    data["strings"] = strings
     return data
 
+def _open_json_stream(file_path):
+    """
+    Open the file in binary mode, skipping a UTF-8 BOM if present.
+    """
+    f = open(file_path, 'rb')
+    if f.read(3) != b'\xef\xbb\xbf':
+        f.seek(0)
+    return f
+
+def _build_value(events):
+    """
+    Consume one complete JSON value (scalar, object, or array) from a
+    basic_parse event stream and return it.
+    """
+    builder = ijson.ObjectBuilder()
+    depth = 0
+    for event, value in events:
+        builder.event(event, value)
+        if event in ('start_map', 'start_array'):
+            depth += 1
+        elif event in ('end_map', 'end_array'):
+            depth -= 1
+        if depth == 0:
+            return builder.value
+
+def _skip_value(events):
+    """
+    Consume and discard one complete JSON value from a basic_parse event stream.
+    """
+    depth = 0
+    for event, _ in events:
+        if event in ('start_map', 'start_array'):
+            depth += 1
+        elif event in ('end_map', 'end_array'):
+            depth -= 1
+        if depth == 0:
+            return
+
+def is_format_only(text):
+    """
+    True if the text contains nothing translatable: no letters at all, only
+    format placeholders, punctuation, whitespace, and digits (e.g. "%@",
+    "—", "42"). Such strings are copied to the target language verbatim.
+    """
+    return not any(c.isalpha() for c in text)
+
 def get_source_text(key, entry, src_lang):
     """
     Get the source text for a given string entry.
@@ -61,86 +288,148 @@ def get_source_text(key, entry, src_lang):
                 return string_unit["value"]
     return key
 
-def translate_batch(texts, source_lang, target_lang, debug=False):
+async def translate_batch(texts, source_lang, target_lang, model=SHORT_TEXT_MODEL, debug=False):
     """
-    Construct a prompt from the list of texts (batch of 10 entries) and call the OpenAI API.
-    The prompt instructs the model to return a JSON array of translation results (e.g.:
-    ["Translation1", "Translation2", ...]). Returns a tuple of:
+    Construct a prompt from the list of texts and POST it to the chat
+    completions endpoint over the shared async HTTP client.
+    The request uses JSON mode (response_format json_object) so the model is
+    forced to return a parseable object of the form
+    {"translations": ["Translation1", "Translation2", ...]}. Returns a tuple of:
       - a list of translations (parsed from the JSON array)
       - a usage dict containing prompt_tokens, completion_tokens, and total_tokens.
-    
-    If the request fails (e.g., timeout, 504 error), wait 3 seconds and retry (up to 3 times).
-    """
-    prompt = (
-        f"Please translate the following texts from {source_lang} to {target_lang}.\n"
-        "Return the translation results as a JSON array, for example:\n"
-        '["Translation1", "Translation2", ...]\n'
-        "Ensure that the returned content is valid JSON and consists of only a JSON array.\n"
-    )
-    for idx, text in enumerate(texts):
-        prompt += f"{idx + 1}. {text}\n"
-    
+
+    If the request fails (e.g., timeout, 504 error), retry with exponential
+    backoff and jitter; 429 rate limits honor the Retry-After header and get
+    a larger retry budget.
+    """
+    header = PROMPT_TEMPLATE.format(src=source_lang, tgt=target_lang)
+    prompt = header + "\n".join(f"{idx + 1}. {text}" for idx, text in enumerate(texts)) + "\n"
+
     if debug:
         print("DEBUG: Prompt:")
         print(prompt)
-    
-    max_retries = 3
+
     attempt = 0
-    while attempt < max_retries:
+    while True:
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a professional translation assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
+            response = await client.post(
+                f"{api_base}/chat/completions",
+                headers={"Authorization": f"Bearer {openai_api_key}"},
+                json={
+                    "model": model,
+                    "messages": [
+                        {"role": "system", "content": SYSTEM_MESSAGE},
+                        {"role": "user", "content": prompt}
+                    ],
+                    "temperature": 0.3,
+                    "response_format": {"type": "json_object"},
+                },
             )
+            response.raise_for_status()
+            payload = response.json()
             break  # Exit loop if request succeeds
-        except Exception as e:
+        except httpx.HTTPStatusError as e:
+            status = e.response.status_code
+            if debug:
+                print("DEBUG: OpenAI API request failed with error:", e)
+            if status != 429 and status < 500:
+                raise  # Client errors other than rate limits will not succeed on retry
+            attempt += 1
+            if attempt >= (MAX_RATE_LIMIT_RETRIES if status == 429 else MAX_RETRIES):
+                raise
+            # Honor the server's Retry-After hint when present (429 bursts).
+            retry_after = e.response.headers.get("Retry-After")
+            try:
+                delay = float(retry_after)
+            except (TypeError, ValueError):
+                delay = backoff_delay(attempt)
+            print(f"Request failed with HTTP {status}, retrying in {delay:.1f} seconds...")
+            await asyncio.sleep(delay)
+        except httpx.HTTPError as e:
             attempt += 1
             if debug:
                 print("DEBUG: OpenAI API request failed with error:", e)
-            if attempt < max_retries:
-                print("Request failed, waiting 3 seconds before retrying...")
-                time.sleep(3)
-            else:
-                raise e
+            if attempt >= MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Request failed, retrying in {delay:.1f} seconds...")
+            await asyncio.sleep(delay)
+
+    usage = payload.get("usage", {})
+    raw_translation = payload["choices"][0]["message"]["content"].strip()
 
-    usage = response.get("usage", {})
-    raw_translation = response["choices"][0]["message"]["content"].strip()
-    
     if debug:
         print("DEBUG: API token usage:", usage)
         print("DEBUG: Raw translation result:")
         print(raw_translation)
-    
-    try:
-        translations = json.loads(raw_translation)
-        if not isinstance(translations, list):
-            raise ValueError("The returned JSON is not an array")
-    except Exception as e:
-        if debug:
-            print("DEBUG: JSON parsing failed:", e)
-            print("DEBUG: Falling back to line-by-line splitting.")
-        translations = []
-        for line in raw_translation.splitlines():
-            line = line.strip()
-            if line:
-                if line[0].isdigit() and len(line) > 1 and (line[1] == '.' or line[1] == ')'):
-                    parts = line.split(maxsplit=1)
-                    if len(parts) > 1:
-                        line = parts[1]
-                translations.append(line)
+
+    translations = orjson.loads(raw_translation).get("translations", [])
+    if not isinstance(translations, list):
+        raise ValueError("The returned JSON does not contain a 'translations' array")
     if debug:
         print("DEBUG: Parsed translation results:", translations)
     return translations, usage
 
-def update_localizations_for_language(data, translations, target_lang):
+def merge_usage(*usages):
+    """
+    Sum the numeric counters of several usage dicts.
+    """
+    merged = {}
+    for usage in usages:
+        for key, value in usage.items():
+            merged[key] = merged.get(key, 0) + value
+    return merged
+
+async def translate_batch_checked(texts, source_lang, target_lang, model=SHORT_TEXT_MODEL, debug=False):
+    """
+    Call translate_batch and verify the model returned exactly one
+    translation per input text. On a length mismatch the results cannot be
+    zipped safely (translations would shift onto the wrong keys), so the
+    batch is split in half and retried recursively. A single text that still
+    comes back misaligned yields None so the caller can mark it for review.
+    Mismatches are counted in the returned usage dict under
+    "mismatched_batches".
+    """
+    translations, usage = await translate_batch(texts, source_lang, target_lang, model=model, debug=debug)
+    if len(translations) == len(texts):
+        return translations, usage
+    usage = merge_usage(usage, {"mismatched_batches": 1})
+    if len(texts) == 1:
+        print(f"Could not get an aligned translation for one text, marking it for review.")
+        return [None], usage
+    print(f"Model returned {len(translations)} translations for {len(texts)} texts, splitting the batch...")
+    mid = len(texts) // 2
+    left, left_usage = await translate_batch_checked(texts[:mid], source_lang, target_lang, model=model, debug=debug)
+    right, right_usage = await translate_batch_checked(texts[mid:], source_lang, target_lang, model=model, debug=debug)
+    return left + right, merge_usage(usage, left_usage, right_usage)
+
+def build_translated_index(strings_dict):
+    """
+    Single pass over the strings returning:
+      - should_skip: keys marked shouldTranslate=False
+      - translated_index: language code -> set of keys that already have a
+        non-empty translation for that language.
+    Avoids re-walking every entry's nested dicts once per target language.
+    """
+    should_skip = set()
+    translated_index = {}
+    for key, entry in strings_dict.items():
+        if not isinstance(entry, dict):
+            continue
+        if entry.get("shouldTranslate") is False:
+            should_skip.add(key)
+            continue
+        for lang, loc in entry.get("localizations", {}).items():
+            if isinstance(loc, dict) and loc.get("stringUnit", {}).get("value", "").strip():
+                translated_index.setdefault(lang, set()).add(key)
+    return should_skip, translated_index
+
+def update_localizations_for_language(data, translations, target_lang, index=None, state="translated"):
     """
     Update each string entry in the JSON data by adding or updating the translation for the given target language.
-    The translation is stored under localizations[target_lang] with the state set to "translated".
+    The translation is stored under localizations[target_lang] with the given state (default "translated").
     The translations parameter is a dictionary with keys as string keys and values as the translated text.
+    When an index from build_translated_index is given, the inserted keys are recorded there as well.
     """
     strings_dict = data.get("strings", {})
     for key, translated_text in translations.items():
@@ -150,99 +439,315 @@ def update_localizations_for_language(data, translations, target_lang):
         localizations = entry.get("localizations", {})
         localizations[target_lang] = {
             "stringUnit": {
-                "state": "translated",
+                "state": state,
                 "value": translated_text
             }
         }
         entry["localizations"] = localizations
         strings_dict[key] = entry
     data["strings"] = strings_dict
+    if index is not None:
+        index.setdefault(target_lang, set()).update(translations)
 
 def persist_file(file_path, data):
     """
     Write the JSON data back to the file in a formatted manner.
+    The data is written to a temporary file first and atomically renamed into
+    place, so a crash or Ctrl-C mid-write can never leave a truncated file.
+    String entries are serialized one at a time, keeping the encoding buffer
+    at O(entry) instead of one document-sized blob.
     """
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(b'{\n')
+        first = True
+        for field, value in data.items():
+            if field == "strings":
+                continue
+            if not first:
+                f.write(b',\n')
+            f.write(b'  ' + orjson.dumps(field) + b': ' + orjson.dumps(value))
+            first = False
+        if not first:
+            f.write(b',\n')
+        f.write(b'  "strings": {')
+        first = True
+        for key, entry in data.get("strings", {}).items():
+            if not first:
+                f.write(b',')
+            f.write(b'\n    ' + orjson.dumps(key) + b': ')
+            f.write(orjson.dumps(entry, option=orjson.OPT_INDENT_2).replace(b'\n', b'\n    '))
+            first = False
+        if not first:
+            f.write(b'\n  ')
+        f.write(b'}\n}\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Automatically translate texts in a Localizable.xcstrings file using OpenAI and update the file."
-    )
-    parser.add_argument("--file", type=str, default="Localizable.xcstrings",
-                        help="Path to the Localizable.xcstrings file")
-    parser.add_argument("--languages", type=str, default="zh,fr,de",
-                        help="Target languages (comma-separated), e.g., zh,fr,de")
-    parser.add_argument("--source-language", type=str, default="",
-                        help="Source language code; if empty, the 'sourceLanguage' field in the file is used")
-    parser.add_argument("--openai-endpoint", type=str, default="https://api.openai.com/v1",
-                        help="OpenAI API endpoint (default: https://api.openai.com/v1)")
-    parser.add_argument("--debug", action="store_true", help="Enable debug mode to print detailed information")
-    args = parser.parse_args()
+def journal_path_for(file_path):
+    """
+    Path of the append-only journal that records translations between full file writes.
+    """
+    return file_path + ".journal.jsonl"
 
-    # Configure OpenAI API endpoint
-    openai.api_base = args.openai_endpoint
+def replay_journal(file_path, data):
+    """
+    If a journal from an interrupted run exists, merge its translations into
+    the data, persist the file, and remove the journal.
+    """
+    journal_path = journal_path_for(file_path)
+    if not os.path.exists(journal_path):
+        return
+    per_lang = {}
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Truncated trailing line from a crash mid-write
+            per_lang.setdefault(record["lang"], {})[record["key"]] = record["value"]
+    for lang, translations in per_lang.items():
+        update_localizations_for_language(data, translations, lang)
+    if per_lang:
+        persist_file(file_path, data)
+        recovered = sum(len(v) for v in per_lang.values())
+        print(f"Recovered {recovered} translations from the journal of an interrupted run.")
+    os.remove(journal_path)
 
+def acquire_file_lock(file_path):
+    """
+    Take an exclusive advisory lock next to the xcstrings file so that two
+    instances of the script cannot write over each other's translations.
+    Raises RuntimeError if another run already holds the lock; the lock is
+    released automatically when the process exits.
+    """
+    lock_path = file_path + ".lock"
+    lock_fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(lock_fd)
+        raise RuntimeError(
+            f"Another instance is already translating {file_path} (lock file: {lock_path})"
+        )
+
+    def release():
+        # The lock file itself is left in place: unlinking it would let a
+        # process holding the old inode and one locking a fresh file at the
+        # same path both believe they own the xcstrings file.
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        os.close(lock_fd)
+
+    atexit.register(release)
+
+async def main_async(args):
     file_path = args.file
     data = parse_xcstrings(file_path)
+    replay_journal(file_path, data)
     source_lang = args.source_language or data.get("sourceLanguage", "en")
     print(f"Using source language: {source_lang}")
 
     strings_dict = data.get("strings", {})
+    should_skip, translated_index = build_translated_index(strings_dict)
 
-    # Global token usage statistics
-    total_prompt_tokens = 0
-    total_completion_tokens = 0
-    total_tokens = 0
+    tm_conn = tm_connect()
 
-    # Process each target language
-    target_languages = [lang.strip() for lang in args.languages.split(",") if lang.strip()]
-    for target_lang in target_languages:
-        if target_lang == source_lang:
-            print(f"Skipping source language {source_lang}")
-            continue
-        print(f"\nStarting translation for target language: {target_lang}")
+    # Append-only journal for crash safety: each finished batch is recorded
+    # immediately, while the (much larger) xcstrings file is only rewritten
+    # once per language.
+    journal = open(journal_path_for(file_path), 'a', encoding='utf-8')
+
+    # Global token usage statistics, shared by all language tasks.
+    totals = {
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "mismatched_batches": 0,
+    }
+
+    # Bound the number of in-flight API requests across all batches of all
+    # languages, and serialize mutations of the shared data dict.
+    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    data_lock = asyncio.Lock()
+
+    async def run_batch(batch_texts, source_lang, target_lang, keys_by_text, model):
+        async with sem:
+            translated_batch, usage = await translate_batch_checked(
+                batch_texts, source_lang, target_lang, model=model, debug=args.debug
+            )
+        # Journal each finished batch right away so an interrupted run can be
+        # replayed without re-translating.
+        for text, trans in zip(batch_texts, translated_batch):
+            if trans is None:
+                continue
+            for key in keys_by_text.get(text, []):
+                journal.write(json.dumps(
+                    {"lang": target_lang, "key": key, "value": trans},
+                    ensure_ascii=False) + "\n")
+        journal.flush()
+        return batch_texts, translated_batch, usage
+
+    async def translate_language(target_lang):
+        print(f"Starting translation for target language: {target_lang}")
         # Select keys to translate: skip entries with shouldTranslate=False or those already translated
         keys_to_translate = []
         source_texts = {}
+        cached_translations = {}
+        verbatim_translations = {}
+        translated_keys = translated_index.get(target_lang, set())
         for key, entry in strings_dict.items():
-            if isinstance(entry, dict) and entry.get("shouldTranslate") is False:
+            if key in should_skip or key in translated_keys:
                 continue
-            if isinstance(entry, dict):
-                locs = entry.get("localizations", {})
-                if target_lang in locs:
-                    existing_value = locs[target_lang].get("stringUnit", {}).get("value", "").strip()
-                    if existing_value:
-                        continue
             text = get_source_text(key, entry, source_lang)
+            # Format-only strings ("%@", "42", ...) are copied verbatim.
+            if is_format_only(text):
+                verbatim_translations[key] = text
+                continue
+            # Consult the translation memory next; cache hits skip the API entirely.
+            cached = tm_get(tm_conn, tm_hash(source_lang, target_lang, text))
+            if cached is not None:
+                cached_translations[key] = cached
+                continue
             source_texts[key] = text
             keys_to_translate.append(key)
 
+        async with data_lock:
+            if verbatim_translations:
+                print(f"Copied {len(verbatim_translations)} format-only strings verbatim for {target_lang}.")
+                update_localizations_for_language(data, verbatim_translations, target_lang, index=translated_index)
+            if cached_translations:
+                print(f"Reused {len(cached_translations)} translations from the translation memory for {target_lang}.")
+                update_localizations_for_language(data, cached_translations, target_lang, index=translated_index)
+
         total_keys = len(keys_to_translate)
         if total_keys == 0:
-            print(f"All entries already have translations for {target_lang}, skipping.")
-            continue
+            if cached_translations or verbatim_translations:
+                async with data_lock:
+                    persist_file(file_path, data)
+                print(f"All remaining entries for {target_lang} resolved without the API, file written.")
+            else:
+                print(f"All entries already have translations for {target_lang}, skipping.")
+            return
+
+        # Translate each distinct source text only once; keys sharing a text
+        # (e.g. "OK" appearing under several keys) get the same result fanned
+        # back out afterwards.
+        unique_texts = {}
+        for key in keys_to_translate:
+            unique_texts.setdefault(source_texts[key], []).append(key)
+        texts = list(unique_texts)
+        total_texts = len(texts)
+
+        print(f"Number of entries to translate for {target_lang}: {total_keys} ({total_texts} unique texts)")
+        # Schedule all batches for this language concurrently; the semaphore
+        # keeps the number of simultaneous requests bounded.
+        # Route short labels and longer prose to different model tiers; each
+        # partition is packed into batches independently.
+        short_texts = [t for t in texts if is_short_text(t)]
+        long_texts = [t for t in texts if not is_short_text(t)]
+        tasks = [
+            run_batch(batch_texts, source_lang, target_lang, unique_texts, SHORT_TEXT_MODEL)
+            for batch_texts in pack_batches(short_texts)
+        ]
+        tasks += [
+            run_batch(batch_texts, source_lang, target_lang, unique_texts, LONG_TEXT_MODEL)
+            for batch_texts in pack_batches(long_texts)
+        ]
+        print(f"Dispatching {len(tasks)} batches for {target_lang}...")
+        results = await asyncio.gather(*tasks)
+
+        translations_for_text = {}
+        for batch_texts, translated_batch, usage in results:
+            for counter in totals:
+                totals[counter] += usage.get(counter, 0)
+            for text, trans in zip(batch_texts, translated_batch):
+                translations_for_text[text] = trans
 
-        print(f"Number of entries to translate: {total_keys}")
         translations_for_lang = {}
-        for i in range(0, total_keys, 10):
-            batch_keys = keys_to_translate[i:i+10]
-            batch_texts = [source_texts[k] for k in batch_keys]
-            print(f"Translating entries {i+1} to {min(i+10, total_keys)} for {target_lang}...")
-            translated_batch, usage = translate_batch(batch_texts, source_lang, target_lang, debug=args.debug)
-            total_prompt_tokens += usage.get("prompt_tokens", 0)
-            total_completion_tokens += usage.get("completion_tokens", 0)
-            total_tokens += usage.get("total_tokens", 0)
-            for key, trans in zip(batch_keys, translated_batch):
-                translations_for_lang[key] = trans
-            update_localizations_for_language(data, translations_for_lang, target_lang)
+        needs_review_for_lang = {}
+        for text, trans in translations_for_text.items():
+            for key in unique_texts[text]:
+                if trans is None:
+                    # Keep the source text but flag it so the misalignment is
+                    # visible in Xcode instead of silently wrong.
+                    needs_review_for_lang[key] = text
+                else:
+                    translations_for_lang[key] = trans
+
+        # Remember the fresh translations for future runs.
+        tm_put_many(tm_conn, [
+            (tm_hash(source_lang, target_lang, text), trans)
+            for text, trans in translations_for_text.items()
+            if trans is not None
+        ])
+
+        # Write the file once per language, after all batches have finished.
+        # Other language tasks may be mid-flight, so mutate and persist under
+        # the lock; their journaled batches survive until the end of the run.
+        async with data_lock:
+            if needs_review_for_lang:
+                print(f"{len(needs_review_for_lang)} entries could not be aligned and were marked needs_review.")
+                update_localizations_for_language(
+                    data, needs_review_for_lang, target_lang,
+                    index=translated_index, state="needs_review")
+            update_localizations_for_language(data, translations_for_lang, target_lang, index=translated_index)
             persist_file(file_path, data)
-            print(f"Updated {min(i+10, total_keys)} entries, file written.")
-            translations_for_lang = {}
+        print(f"Updated {len(translations_for_lang)} entries for {target_lang}, file written.")
         print(f"Translation for target language {target_lang} completed.")
-    
+
+    # All target languages run concurrently; total wall-time approaches the
+    # slowest language rather than the sum, bounded by the shared semaphore.
+    target_languages = [lang.strip() for lang in args.languages.split(",") if lang.strip()]
+    lang_tasks = []
+    for target_lang in target_languages:
+        if target_lang == source_lang:
+            print(f"Skipping source language {source_lang}")
+            continue
+        lang_tasks.append(translate_language(target_lang))
+    await asyncio.gather(*lang_tasks)
+
+    journal.close()
+    os.remove(journal_path_for(file_path))
+
     print("\nTranslation process completed!")
-    print(f"Total tokens used: prompt={total_prompt_tokens}, completion={total_completion_tokens}, total={total_tokens}")
+    print(f"Total tokens used: prompt={totals['prompt_tokens']}, "
+          f"completion={totals['completion_tokens']}, total={totals['total_tokens']}")
+    if totals["mismatched_batches"]:
+        print(f"Batches with misaligned replies (retried at smaller sizes): {totals['mismatched_batches']}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Automatically translate texts in a Localizable.xcstrings file using OpenAI and update the file."
+    )
+    parser.add_argument("--file", type=str, default="Localizable.xcstrings",
+                        help="Path to the Localizable.xcstrings file")
+    parser.add_argument("--languages", type=str, default="zh,fr,de",
+                        help="Target languages (comma-separated), e.g., zh,fr,de")
+    parser.add_argument("--source-language", type=str, default="",
+                        help="Source language code; if empty, the 'sourceLanguage' field in the file is used")
+    parser.add_argument("--openai-endpoint", type=str, default="https://api.openai.com/v1",
+                        help="OpenAI API endpoint (default: https://api.openai.com/v1)")
+    parser.add_argument("--debug", action="store_true", help="Enable debug mode to print detailed information")
+    args = parser.parse_args()
+
+    # Configure OpenAI API endpoint
+    global api_base
+    api_base = args.openai_endpoint.rstrip("/")
+
+    # Refuse to run alongside another instance working on the same file.
+    acquire_file_lock(args.file)
+
+    async def run():
+        try:
+            await main_async(args)
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()